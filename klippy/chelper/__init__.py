@@ -3,7 +3,7 @@
 # Copyright (C) 2016-2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import os, logging
+import os, logging, subprocess, hashlib
 import cffi
 
 
@@ -12,9 +12,8 @@ import cffi
 ######################################################################
 
 GCC_CMD = "gcc"
-COMPILE_ARGS = ("-Wall -g -O2 -shared -fPIC"
-                " -flto -fwhole-program -fno-use-linker-plugin"
-                " -o %s %s")
+COMPILE_ARGS = "-Wall -O2 -shared -fPIC -fwhole-program"
+DEBUG_FLAGS = "-g"
 SSE_FLAGS = "-mfpmath=sse -msse2"
 SOURCE_FILES = [
     'pyhelper.c', 'serialqueue.c', 'stepcompress.c', 'itersolve.c', 'trapq.c',
@@ -24,6 +23,9 @@ SOURCE_FILES = [
     'kin_extruder.c', 'kin_shaper.c',
 ]
 DEST_LIB = "c_helper.so"
+UNITY_FILE = "c_helper_unity.c"
+DEST_HASH = "c_helper.hash"
+DEST_FFI = "c_helper_ffi.py"
 OTHER_FILES = [
     'list.h', 'serialqueue.h', 'stepcompress.h', 'itersolve.h', 'pyhelper.h',
     'trapq.h', 'pollreactor.h', 'msgblock.h'
@@ -235,6 +237,35 @@ def check_build_code(sources, target):
     obj_times = get_mtimes([target])
     return not obj_times or max(src_times) > min(obj_times)
 
+# Return a hash of the build command and the contents of the source files
+def get_build_hash(cmd, sources):
+    h = hashlib.sha1(" ".join(cmd).encode())
+    for filename in sources:
+        f = open(filename, 'rb')
+        h.update(f.read())
+        f.close()
+    return h.hexdigest()
+
+# Check if the library was built from identical sources (as recorded
+# in the given hash file)
+def check_build_hash(build_hash, desthash):
+    try:
+        f = open(desthash, 'r')
+        prev_hash = f.read().strip()
+        f.close()
+    except (IOError, OSError):
+        return False
+    return prev_hash == build_hash
+
+# Record the hash of the sources used to build the library
+def write_build_hash(build_hash, desthash):
+    try:
+        f = open(desthash, 'w')
+        f.write(build_hash + "\n")
+        f.close()
+    except (IOError, OSError):
+        logging.exception("Unable to write build hash %s", desthash)
+
 # Check if the current gcc version supports a particular command-line option
 def check_gcc_option(option):
     cmd = "%s %s -S -o /dev/null -xc /dev/null > /dev/null 2>&1" % (
@@ -242,14 +273,58 @@ def check_gcc_option(option):
     res = os.system(cmd)
     return res == 0
 
-# Check if the current gcc version supports a particular command-line option
+# Build the given command (a list of program arguments)
 def do_build_code(cmd):
-    res = os.system(cmd)
+    try:
+        res = subprocess.call(cmd)
+    except OSError as e:
+        res = e
     if res:
         msg = "Unable to build C code module (error=%s)" % (res,)
         logging.error(msg)
         raise Exception(msg)
 
+# Generate a single C file that includes all the source files (so that
+# the compiler can optimize across all of the code)
+def build_unity_file(srcfiles, destunity):
+    data = "".join(['#include "%s"\n' % (os.path.basename(fname),)
+                    for fname in srcfiles])
+    tmpfile = destunity + ".tmp"
+    f = open(tmpfile, 'w')
+    f.write("// Generated file - do not edit\n" + data)
+    f.close()
+    os.rename(tmpfile, destunity)
+
+# Parse the C definitions into a new ffi object
+def build_ffi():
+    ffi = cffi.FFI()
+    for d in defs_all:
+        ffi.cdef(d)
+    return ffi
+
+# Store the parsed C definitions in a python module (so that they do
+# not need to be reparsed on each startup)
+def build_ffi_module(destffi):
+    ffi = build_ffi()
+    ffi.set_source(os.path.splitext(DEST_FFI)[0], None,
+                   compiler_verbose=False)
+    tmpfile = destffi + ".tmp"
+    ffi.emit_python_code(tmpfile)
+    os.rename(tmpfile, destffi)
+
+# Load the cached C definitions (or parse them if that is not possible)
+def load_ffi(destffi):
+    try:
+        if check_build_code([__file__, cffi.__file__], destffi):
+            logging.info("Building C definitions module %s", DEST_FFI)
+            build_ffi_module(destffi)
+        from . import c_helper_ffi
+        return c_helper_ffi.ffi
+    except Exception:
+        logging.exception("Unable to load C definitions module %s",
+                          DEST_FFI)
+        return build_ffi()
+
 FFI_main = None
 FFI_lib = None
 pyhelper_logging_callback = None
@@ -266,16 +341,31 @@ def get_ffi():
         srcfiles = get_abs_files(srcdir, SOURCE_FILES)
         ofiles = get_abs_files(srcdir, OTHER_FILES)
         destlib = get_abs_files(srcdir, [DEST_LIB])[0]
-        if check_build_code(srcfiles+ofiles+[__file__], destlib):
+        destunity = get_abs_files(srcdir, [UNITY_FILE])[0]
+        desthash = get_abs_files(srcdir, [DEST_HASH])[0]
+        destffi = get_abs_files(srcdir, [DEST_FFI])[0]
+        # A debug build is also considered on each KLIPPY_DEBUG startup
+        # (the -g flag is part of the build hash, so this rebuilds only
+        # if the existing library was not built with it)
+        is_debug = not not os.environ.get('KLIPPY_DEBUG')
+        if (check_build_code(srcfiles+ofiles+[__file__], destlib)
+            or is_debug):
+            cmd = [GCC_CMD] + COMPILE_ARGS.split()
+            if is_debug:
+                cmd += DEBUG_FLAGS.split()
             if check_gcc_option(SSE_FLAGS):
-                cmd = "%s %s %s" % (GCC_CMD, SSE_FLAGS, COMPILE_ARGS)
+                cmd += SSE_FLAGS.split()
+            build_hash = get_build_hash(cmd, srcfiles + ofiles)
+            if (check_build_hash(build_hash, desthash)
+                and os.path.exists(destlib)):
+                # Sources were touched but not modified - no need to rebuild
+                os.utime(destlib, None)
             else:
-                cmd = "%s %s" % (GCC_CMD, COMPILE_ARGS)
-            logging.info("Building C code module %s", DEST_LIB)
-            do_build_code(cmd % (destlib, ' '.join(srcfiles)))
-        FFI_main = cffi.FFI()
-        for d in defs_all:
-            FFI_main.cdef(d)
+                logging.info("Building C code module %s", DEST_LIB)
+                build_unity_file(srcfiles, destunity)
+                do_build_code(cmd + ['-o', destlib, destunity])
+                write_build_hash(build_hash, desthash)
+        FFI_main = load_ffi(destffi)
         FFI_lib = FFI_main.dlopen(destlib)
         # Setup error logging
         pyhelper_logging_callback = FFI_main.callback("void func(const char *)",
@@ -288,7 +378,8 @@ def get_ffi():
 # hub-ctrl hub power controller
 ######################################################################
 
-HC_COMPILE_CMD = "gcc -Wall -g -O2 -o %s %s -lusb"
+HC_COMPILE_ARGS = "-Wall -g -O2"
+HC_LINK_ARGS = "-lusb"
 HC_SOURCE_FILES = ['hub-ctrl.c']
 HC_SOURCE_DIR = '../../lib/hub-ctrl'
 HC_TARGET = "hub-ctrl"
@@ -301,7 +392,8 @@ def run_hub_ctrl(enable_power):
     destlib = get_abs_files(hubdir, [HC_TARGET])[0]
     if check_build_code(srcfiles, destlib):
         logging.info("Building C code module %s", HC_TARGET)
-        do_build_code(HC_COMPILE_CMD % (destlib, ' '.join(srcfiles)))
+        do_build_code([GCC_CMD] + HC_COMPILE_ARGS.split() + ['-o', destlib]
+                      + srcfiles + HC_LINK_ARGS.split())
     os.system(HC_CMD % (hubdir, enable_power))
 
 
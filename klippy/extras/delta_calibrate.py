@@ -173,22 +173,31 @@ class DeltaCalibrate:
         z_weight = 1.
         if distances:
             z_weight = len(distances) / (MEASURE_WEIGHT * len(probe_positions))
+        # Gather all stable positions so each error calculation can
+        # convert them to cartesian coordinates in a single pass
+        height_goals = [z_offset for z_offset, spos in height_positions]
+        dist_goals = [dist for dist, spos1, spos2 in distances]
+        all_spos = ([spos for z_offset, spos in height_positions]
+                    + [spos1 for dist, spos1, spos2 in distances]
+                    + [spos2 for dist, spos1, spos2 in distances])
+        num_heights = len(height_goals)
+        num_dists = len(dist_goals)
         # Perform coordinate descent
         def delta_errorfunc(params):
             try:
                 # Build new delta_params for params under test
                 delta_params = orig_delta_params.new_calibration(params)
-                getpos = delta_params.get_position_from_stable
+                positions = delta_params.get_positions_from_stable(all_spos)
                 # Calculate z height errors
-                total_error = 0.
-                for z_offset, stable_pos in height_positions:
-                    x, y, z = getpos(stable_pos)
-                    total_error += (z - z_offset)**2
+                total_error = sum([(pos[2] - z_offset)**2
+                                   for pos, z_offset in zip(positions,
+                                                            height_goals)])
                 total_error *= z_weight
                 # Calculate distance errors
-                for dist, stable_pos1, stable_pos2 in distances:
-                    x1, y1, z1 = getpos(stable_pos1)
-                    x2, y2, z2 = getpos(stable_pos2)
+                pos1 = positions[num_heights:num_heights+num_dists]
+                pos2 = positions[num_heights+num_dists:]
+                for (x1, y1, z1), (x2, y2, z2), dist in zip(pos1, pos2,
+                                                            dist_goals):
                     d = math.sqrt((x1-x2)**2 + (y1-y2)**2 + (z1-z2)**2)
                     total_error += (d - dist)**2
                 return total_error
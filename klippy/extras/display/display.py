@@ -155,8 +155,8 @@ class PrinterDisplayTemplate:
             data = dg.get('data', None)
             if data is not None:
                 idata = self._parse_glyph(config, glyph_name, data, 16, 16)
-                icon1 = [(bits >> 8) & 0xff for bits in idata]
-                icon2 = [bits & 0xff for bits in idata]
+                icon1 = bytearray([(bits >> 8) & 0xff for bits in idata])
+                icon2 = bytearray([bits & 0xff for bits in idata])
                 icons.setdefault(glyph_name, {})['icon16x16'] = (icon1, icon2)
             data = dg.get('hd44780_data', None)
             if data is not None:
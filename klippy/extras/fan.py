@@ -40,6 +40,9 @@ class Fan:
         self.tachometer = FanTachometer(config)
 
         # Register callbacks
+        self.register_lookahead_callback = None
+        self.printer.register_event_handler("klippy:connect",
+                                            self._handle_connect)
         self.printer.register_event_handler("gcode:request_restart",
                                             self._handle_request_restart)
 
@@ -66,9 +69,11 @@ class Fan:
         self.last_fan_time = print_time
         self.last_fan_value = value
     def set_speed_from_command(self, value):
+        self.register_lookahead_callback((lambda pt:
+                                          self.set_speed(pt, value)))
+    def _handle_connect(self):
         toolhead = self.printer.lookup_object('toolhead')
-        toolhead.register_lookahead_callback((lambda pt:
-                                              self.set_speed(pt, value)))
+        self.register_lookahead_callback = toolhead.register_lookahead_callback
     def _handle_request_restart(self, print_time):
         self.set_speed(print_time, 0.)
 
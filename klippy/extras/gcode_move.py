@@ -38,6 +38,7 @@ class GCodeMove:
                                desc=self.cmd_GET_POSITION_help)
         self.Coord = gcode.Coord
         # G-Code coordinate manipulation
+        self.axis_positions = (('X', 0), ('Y', 1), ('Z', 2))
         self.absolute_coord = self.absolute_extrude = True
         self.base_position = [0.0, 0.0, 0.0, 0.0]
         self.last_position = [0.0, 0.0, 0.0, 0.0]
@@ -113,24 +114,27 @@ class GCodeMove:
     def cmd_G1(self, gcmd):
         # Move
         params = gcmd.get_command_parameters()
+        last_position = self.last_position
+        base_position = self.base_position
+        absolute_coord = self.absolute_coord
         try:
-            for pos, axis in enumerate('XYZ'):
+            for axis, pos in self.axis_positions:
                 if axis in params:
                     v = float(params[axis])
-                    if not self.absolute_coord:
+                    if not absolute_coord:
                         # value relative to position of last move
-                        self.last_position[pos] += v
+                        last_position[pos] += v
                     else:
                         # value relative to base coordinate position
-                        self.last_position[pos] = v + self.base_position[pos]
+                        last_position[pos] = v + base_position[pos]
             if 'E' in params:
                 v = float(params['E']) * self.extrude_factor
-                if not self.absolute_coord or not self.absolute_extrude:
+                if not absolute_coord or not self.absolute_extrude:
                     # value relative to position of last move
-                    self.last_position[3] += v
+                    last_position[3] += v
                 else:
                     # value relative to base coordinate position
-                    self.last_position[3] = v + self.base_position[3]
+                    last_position[3] = v + base_position[3]
             if 'F' in params:
                 gcode_speed = float(params['F'])
                 if gcode_speed <= 0.:
@@ -140,7 +144,7 @@ class GCodeMove:
         except ValueError as e:
             raise gcmd.error("Unable to parse move '%s'"
                              % (gcmd.get_commandline(),))
-        self.move_with_transform(self.last_position, self.speed)
+        self.move_with_transform(last_position, self.speed)
     # G-Code coordinate manipulation
     def cmd_G20(self, gcmd):
         # Set units to inches
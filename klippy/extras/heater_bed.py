@@ -7,7 +7,7 @@
 class PrinterHeaterBed:
     def __init__(self, config):
         self.printer = config.get_printer()
-        pheaters = self.printer.load_object(config, 'heaters')
+        self.pheaters = pheaters = self.printer.load_object(config, 'heaters')
         self.heater = pheaters.setup_heater(config, 'B')
         self.get_status = self.heater.get_status
         self.stats = self.heater.stats
@@ -18,8 +18,7 @@ class PrinterHeaterBed:
     def cmd_M140(self, gcmd, wait=False):
         # Set Bed Temperature
         temp = gcmd.get_float('S', 0.)
-        pheaters = self.printer.lookup_object('heaters')
-        pheaters.set_temperature(self.heater, temp, wait)
+        self.pheaters.set_temperature(self.heater, temp, wait)
     def cmd_M190(self, gcmd):
         # Set Bed Temperature and Wait
         self.cmd_M140(gcmd, wait=True)
@@ -231,6 +231,9 @@ class PrinterHeaters:
         self.available_heaters = []
         self.available_sensors = []
         self.has_started = self.have_load_sensors = False
+        self.register_lookahead_callback = None
+        self.printer.register_event_handler("klippy:connect",
+                                            self._handle_connect)
         self.printer.register_event_handler("klippy:ready", self._handle_ready)
         self.printer.register_event_handler("gcode:request_restart",
                                             self.turn_off_all_heaters)
@@ -302,6 +305,9 @@ class PrinterHeaters:
     cmd_TURN_OFF_HEATERS_help = "Turn off all heaters"
     def cmd_TURN_OFF_HEATERS(self, gcmd):
         self.turn_off_all_heaters()
+    def _handle_connect(self):
+        toolhead = self.printer.lookup_object('toolhead')
+        self.register_lookahead_callback = toolhead.register_lookahead_callback
     # G-Code M105 temperature reporting
     def _handle_ready(self):
         self.has_started = True
@@ -335,8 +341,7 @@ class PrinterHeaters:
             gcode.respond_raw(self._get_temp(eventtime))
             eventtime = reactor.pause(eventtime + 1.)
     def set_temperature(self, heater, temp, wait=False):
-        toolhead = self.printer.lookup_object('toolhead')
-        toolhead.register_lookahead_callback((lambda pt: None))
+        self.register_lookahead_callback((lambda pt: None))
         heater.set_temp(temp)
         if wait and temp:
             self._wait_for_temperature(heater)
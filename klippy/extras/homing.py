@@ -228,6 +228,7 @@ class PrinterHoming:
         # Register g-code commands
         gcode = self.printer.lookup_object('gcode')
         gcode.register_command('G28', self.cmd_G28)
+        self.axis_positions = (('X', 0), ('Y', 1), ('Z', 2))
     def manual_home(self, toolhead, endstops, pos, speed,
                     triggered, check_triggered):
         hmove = HomingMove(self.printer, endstops, toolhead)
@@ -255,10 +256,8 @@ class PrinterHoming:
         return epos
     def cmd_G28(self, gcmd):
         # Move to origin
-        axes = []
-        for pos, axis in enumerate('XYZ'):
-            if gcmd.get(axis, None) is not None:
-                axes.append(pos)
+        params = gcmd.get_command_parameters()
+        axes = [pos for axis, pos in self.axis_positions if axis in params]
         if not axes:
             axes = [0, 1, 2]
         homing_state = Homing(self.printer)
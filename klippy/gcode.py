@@ -3,7 +3,7 @@
 # Copyright (C) 2016-2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import os, re, logging, collections, shlex
+import os, re, logging, collections, shlex, errno
 
 class CommandError(Exception):
     pass
@@ -13,13 +13,16 @@ Coord = collections.namedtuple('Coord', ('x', 'y', 'z', 'e'))
 class GCodeCommand:
     error = CommandError
     def __init__(self, gcode, command, commandline, params, need_ack):
+        self._gcode = gcode
         self._command = command
         self._commandline = commandline
         self._params = params
         self._need_ack = need_ack
-        # Method wrappers
-        self.respond_info = gcode.respond_info
-        self.respond_raw = gcode.respond_raw
+    # Method wrappers
+    def respond_info(self, msg, log=True):
+        self._gcode.respond_info(msg, log)
+    def respond_raw(self, msg):
+        self._gcode.respond_raw(msg)
     def get_command(self):
         return self._command
     def get_commandline(self):
@@ -47,7 +50,7 @@ class GCodeCommand:
         ok_msg = "ok"
         if msg:
             ok_msg = "ok %s" % (msg,)
-        self.respond_raw(ok_msg)
+        self._gcode.respond_raw(ok_msg)
         self._need_ack = False
         return True
     # Parameter parsing helpers
@@ -82,6 +85,16 @@ class GCodeCommand:
         return self.get(name, default, parser=int, minval=minval, maxval=maxval)
     def get_float(self, name, default=sentinel, minval=None, maxval=None,
                   above=None, below=None):
+        if (minval is None and maxval is None and above is None
+            and below is None):
+            # Fast path for the common case of an unrestricted value
+            value = self._params.get(name)
+            if value is None and default is not self.sentinel:
+                return default
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                pass
         return self.get(name, default, parser=float, minval=minval,
                         maxval=maxval, above=above, below=below)
 
@@ -171,32 +184,36 @@ class GCodeDispatch:
         self.gcode_handlers = self.ready_gcode_handlers
         self._respond_state("Ready")
     # Parse input into commands
-    args_r = re.compile('([A-Z_]+|[A-Z*/])')
+    args_r = re.compile('([A-Z_]+|[A-Z*/])([^A-Z_*/]*)')
     def _process_commands(self, commands, need_ack=True):
+        # Bind loop invariants to locals (note that self.gcode_handlers
+        # may change during the loop on a ready or shutdown event)
+        args_findall = self.args_r.findall
+        cmd_default = self.cmd_default
+        error = self.error
         for line in commands:
             # Ignore comments and leading/trailing spaces
             line = origline = line.strip()
             cpos = line.find(';')
             if cpos >= 0:
                 line = line[:cpos]
-            # Break line into parts and determine command
-            parts = self.args_r.split(line.upper())
+            # Break line into (name, value) parts and determine command
+            parts = args_findall(line.upper())
             numparts = len(parts)
             cmd = ""
-            if numparts >= 3 and parts[1] != 'N':
-                cmd = parts[1] + parts[2].strip()
-            elif numparts >= 5 and parts[1] == 'N':
+            if numparts >= 1 and parts[0][0] != 'N':
+                cmd = parts[0][0] + parts[0][1].strip()
+            elif numparts >= 2 and parts[0][0] == 'N':
                 # Skip line number at start of command
-                cmd = parts[3] + parts[4].strip()
+                cmd = parts[1][0] + parts[1][1].strip()
             # Build gcode "params" dictionary
-            params = { parts[i]: parts[i+1].strip()
-                       for i in range(1, numparts, 2) }
+            params = { name: value.strip() for name, value in parts }
             gcmd = GCodeCommand(self, cmd, origline, params, need_ack)
             # Invoke handler for command
-            handler = self.gcode_handlers.get(cmd, self.cmd_default)
+            handler = self.gcode_handlers.get(cmd, cmd_default)
             try:
                 handler(gcmd)
-            except self.error as e:
+            except error as e:
                 self._respond_error(str(e))
                 self.printer.send_event("gcode:command_error")
                 if not need_ack:
@@ -352,12 +369,20 @@ class GCodeDispatch:
                 cmdhelp.append("%-10s: %s" % (cmd, self.gcode_help[cmd]))
         gcmd.respond_info("\n".join(cmdhelp), log=False)
 
+# Maximum amount of response data to queue before writing it out
+OUTPUT_BUFFER_SIZE = 4096
+# Maximum amount of unwritten response data before the reader is
+# considered inactive (the queued data is then discarded)
+OUTPUT_BUFFER_MAX = 64 * 1024
+
 # Support reading gcode from a pseudo-tty interface
 class GCodeIO:
     def __init__(self, printer):
         self.printer = printer
         printer.register_event_handler("klippy:ready", self._handle_ready)
         printer.register_event_handler("klippy:shutdown", self._handle_shutdown)
+        printer.register_event_handler("klippy:disconnect",
+                                       self._handle_disconnect)
         self.gcode = printer.lookup_object('gcode')
         self.gcode_mutex = self.gcode.get_mutex()
         self.fd = printer.get_start_args().get("gcode_fd")
@@ -366,12 +391,16 @@ class GCodeIO:
         self.is_processing_data = False
         self.is_fileinput = not not printer.get_start_args().get("debuginput")
         self.pipe_is_active = True
+        self.is_input_paused = False
+        self.is_blocking = False
         self.fd_handle = None
+        self.output_buffer = bytearray()
+        self.flush_timer = self.reactor.register_timer(self._flush_event)
         if not self.is_fileinput:
             self.gcode.register_output_handler(self._respond_raw)
-            self.fd_handle = self.reactor.register_fd(self.fd,
-                                                      self._process_data)
-        self.partial_input = ""
+            self.fd_handle = self.reactor.register_fd(
+                self.fd, self._process_data, self._do_write)
+        self.partial_input = bytearray()
         self.pending_commands = []
         self.bytes_read = 0
         self.input_log = collections.deque([], 50)
@@ -384,28 +413,41 @@ class GCodeIO:
         out = []
         out.append("Dumping gcode input %d blocks" % (len(self.input_log),))
         for eventtime, data in self.input_log:
+            data = str(data.decode('utf-8', 'replace'))
             out.append("Read %f: %s" % (eventtime, repr(data)))
         logging.info("\n".join(out))
     def _handle_shutdown(self):
         if not self.is_printer_ready:
             return
         self.is_printer_ready = False
+        self._flush_output()
         self._dump_debug()
         if self.is_fileinput:
             self.printer.request_exit('error_exit')
+    def _handle_disconnect(self):
+        # The reactor is no longer running - write out pending responses
+        self._flush_output()
     m112_r = re.compile('^(?:[nN][0-9]+)?\s*[mM]112(?:\s|$)')
     def _process_data(self, eventtime):
         # Read input, separate by newline, and add to pending_commands
         try:
-            data = str(os.read(self.fd, 4096).decode())
-        except (os.error, UnicodeDecodeError):
+            data = os.read(self.fd, 4096)
+        except os.error:
             logging.exception("Read g-code")
             return
         self.input_log.append((eventtime, data))
         self.bytes_read += len(data)
-        lines = data.split('\n')
-        lines[0] = self.partial_input + lines[0]
-        self.partial_input = lines.pop()
+        # Only decode complete lines - keep any partial line buffered
+        partial_input = self.partial_input
+        partial_input.extend(data)
+        lpos = partial_input.rfind(b'\n') + 1
+        try:
+            lines = str(partial_input[:lpos].decode()).split('\n')
+        except UnicodeDecodeError:
+            logging.exception("Read g-code")
+            lines = [""]
+        del partial_input[:lpos]
+        lines.pop()
         pending_commands = self.pending_commands
         pending_commands.extend(lines)
         self.pipe_is_active = True
@@ -419,15 +461,17 @@ class GCodeIO:
         # Handle case where multiple commands pending
         if self.is_processing_data or len(pending_commands) > 1:
             if len(pending_commands) < 20:
-                # Check for M112 out-of-order
+                # Check for M112 out-of-order (the substring test is a
+                # quick filter before running the full regex)
+                m112_match = self.m112_r.match
                 for line in lines:
-                    if self.m112_r.match(line) is not None:
+                    if '112' in line and m112_match(line) is not None:
                         self.gcode.cmd_M112(None)
             if self.is_processing_data:
-                if len(pending_commands) >= 20:
+                if len(pending_commands) >= 20 and not self.is_input_paused:
                     # Stop reading input
-                    self.reactor.unregister_fd(self.fd_handle)
-                    self.fd_handle = None
+                    self.is_input_paused = True
+                    self._update_fd_wake()
                 return
         # Process commands
         self.is_processing_data = True
@@ -437,16 +481,57 @@ class GCodeIO:
                 self.gcode._process_commands(pending_commands)
             pending_commands = self.pending_commands
         self.is_processing_data = False
+        self._flush_output()
         if self.fd_handle is None:
             self.fd_handle = self.reactor.register_fd(self.fd,
                                                       self._process_data)
-    def _respond_raw(self, msg):
-        if self.pipe_is_active:
-            try:
-                os.write(self.fd, (msg+"\n").encode())
-            except os.error:
+        elif self.is_input_paused:
+            self.is_input_paused = False
+            self._update_fd_wake()
+    def _update_fd_wake(self):
+        self.reactor.set_fd_wake(self.fd_handle, not self.is_input_paused,
+                                 self.is_blocking)
+    def _flush_output(self):
+        output_buffer = self.output_buffer
+        if not output_buffer:
+            return
+        if not self.pipe_is_active:
+            del output_buffer[:]
+            return
+        try:
+            sent = os.write(self.fd, output_buffer)
+        except os.error as e:
+            if e.errno not in [errno.EAGAIN, errno.EWOULDBLOCK]:
                 logging.exception("Write g-code response")
                 self.pipe_is_active = False
+                del output_buffer[:]
+            sent = 0
+        del output_buffer[:sent]
+        if len(output_buffer) > OUTPUT_BUFFER_MAX:
+            logging.info("G-Code output not being read - discarding")
+            self.pipe_is_active = False
+            del output_buffer[:]
+        # Wait for the fd to become writable if data remains queued
+        is_blocking = not not output_buffer
+        if is_blocking != self.is_blocking:
+            self.is_blocking = is_blocking
+            self._update_fd_wake()
+    def _do_write(self, eventtime):
+        self._flush_output()
+    def _flush_event(self, eventtime):
+        self._flush_output()
+        return self.reactor.NEVER
+    def _respond_raw(self, msg):
+        if not self.pipe_is_active:
+            return
+        # Responses are batched and written together (on an idle reactor
+        # cycle, at the end of an input block, or when the buffer fills)
+        output_buffer = self.output_buffer
+        if not output_buffer:
+            self.reactor.update_timer(self.flush_timer, self.reactor.NOW)
+        output_buffer.extend((msg+"\n").encode())
+        if len(output_buffer) >= OUTPUT_BUFFER_SIZE:
+            self._flush_output()
     def stats(self, eventtime):
         return False, "gcodein=%d" % (self.bytes_read,)
 
@@ -166,22 +166,32 @@ class DeltaKinematics:
         return DeltaCalibration(self.radius, self.angles, self.arm_lengths,
                                 endstops, stepdists)
 
+# Calculate the XY cartesian coordinates of the delta towers
+def calc_towers(radius, angles):
+    radian_angles = [math.radians(a) for a in angles]
+    return [(math.cos(a) * radius, math.sin(a) * radius)
+            for a in radian_angles]
+
 # Delta parameter calibration for DELTA_CALIBRATE tool
 class DeltaCalibration:
-    def __init__(self, radius, angles, arms, endstops, stepdists):
+    # Geometry and tower coordinates of the last calibration created by
+    # new_calibration() (only stored on the object it is called on)
+    last_towers = (None, None)
+    def __init__(self, radius, angles, arms, endstops, stepdists,
+                 towers=None):
         self.radius = radius
         self.angles = angles
         self.arms = arms
         self.endstops = endstops
         self.stepdists = stepdists
-        # Calculate the XY cartesian coordinates of the delta towers
-        radian_angles = [math.radians(a) for a in angles]
-        self.towers = [(math.cos(a) * radius, math.sin(a) * radius)
-                       for a in radian_angles]
+        if towers is None:
+            towers = calc_towers(radius, angles)
+        self.towers = towers
         # Calculate the absolute Z height of each tower endstop
         radius2 = radius**2
         self.abs_endstops = [e + math.sqrt(a**2 - radius2)
                              for e, a in zip(endstops, arms)]
+        self.arm2 = [a**2 for a in arms]
     def coordinate_descent_params(self, is_extended):
         # Determine adjustment parameters (for use with coordinate_descent)
         adj_params = ('radius', 'angle_a', 'angle_b',
@@ -202,19 +212,29 @@ class DeltaCalibration:
         arms = [params['arm_'+a] for a in 'abc']
         endstops = [params['endstop_'+a] for a in 'abc']
         stepdists = [params['stepdist_'+a] for a in 'abc']
-        return DeltaCalibration(radius, angles, arms, endstops, stepdists)
+        # Coordinate descent often only changes the arms or endstops,
+        # so reuse the tower coordinates if the geometry is unchanged
+        geometry, towers = self.last_towers
+        if geometry != (radius, angles):
+            towers = calc_towers(radius, angles)
+            self.last_towers = ((radius, angles), towers)
+        return DeltaCalibration(radius, angles, arms, endstops, stepdists,
+                                towers)
     def get_position_from_stable(self, stable_position):
         # Return cartesian coordinates for the given stable_position
-        sphere_coords = [
-            (t[0], t[1], es - sp * sd)
-            for sd, t, es, sp in zip(self.stepdists, self.towers,
-                                     self.abs_endstops, stable_position) ]
-        return mathutil.trilateration(sphere_coords, [a**2 for a in self.arms])
+        return self.get_positions_from_stable([stable_position])[0]
+    def get_positions_from_stable(self, stable_positions):
+        # Return cartesian coordinates for a list of stable_positions
+        es1, es2, es3 = self.abs_endstops
+        sd1, sd2, sd3 = self.stepdists
+        sphere_zs = [(es1 - sp1 * sd1, es2 - sp2 * sd2, es3 - sp3 * sd3)
+                     for sp1, sp2, sp3 in stable_positions]
+        return mathutil.trilateration_xy(self.towers, sphere_zs, self.arm2)
     def calc_stable_position(self, coord):
         # Return a stable_position from a cartesian coordinate
-        steppos = [
-            math.sqrt(a**2 - (t[0]-coord[0])**2 - (t[1]-coord[1])**2) + coord[2]
-            for t, a in zip(self.towers, self.arms) ]
+        x, y, z = coord[:3]
+        steppos = [math.sqrt(a2 - (tx - x)**2 - (ty - y)**2) + z
+                   for (tx, ty), a2 in zip(self.towers, self.arm2)]
         return [(ep - sp) / sd
                 for sd, ep, sp in zip(self.stepdists,
                                       self.abs_endstops, steppos)]
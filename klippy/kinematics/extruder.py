@@ -160,7 +160,7 @@ class PrinterExtruder:
         self.last_position = 0.
         # Setup hotend heater
         shared_heater = config.get('shared_heater', None)
-        pheaters = self.printer.load_object(config, 'heaters')
+        self.pheaters = pheaters = self.printer.load_object(config, 'heaters')
         gcode_id = 'T%d' % (extruder_num,)
         if shared_heater is None:
             self.heater = pheaters.setup_heater(config, gcode_id)
@@ -178,7 +178,7 @@ class PrinterExtruder:
             'max_extrude_cross_section', def_max_cross_section, above=0.)
         self.max_extrude_ratio = max_cross_section / self.filament_area
         logging.info("Extruder max_extrude_ratio=%.6f", self.max_extrude_ratio)
-        toolhead = self.printer.lookup_object('toolhead')
+        self.toolhead = toolhead = self.printer.lookup_object('toolhead')
         max_velocity, max_accel = toolhead.get_max_velocity()
         self.max_e_velocity = config.getfloat(
             'max_extrude_only_velocity', max_velocity * def_max_extrude_ratio
@@ -292,9 +292,8 @@ class PrinterExtruder:
                     return
                 raise gcmd.error("Extruder not configured")
         else:
-            extruder = self.printer.lookup_object('toolhead').get_extruder()
-        pheaters = self.printer.lookup_object('heaters')
-        pheaters.set_temperature(extruder.get_heater(), temp, wait)
+            extruder = self.toolhead.get_extruder()
+        self.pheaters.set_temperature(extruder.get_heater(), temp, wait)
     def cmd_M109(self, gcmd):
         # Set Extruder Temperature and Wait
         self.cmd_M104(gcmd, wait=True)
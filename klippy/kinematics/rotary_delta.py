@@ -196,6 +196,9 @@ class RotaryDeltaCalibration:
                 for ea, sp, sd in zip(self.abs_endstops, stable_position,
                                       self.stepdists)]
         return self.actuator_to_cartesian(spos)
+    def get_positions_from_stable(self, stable_positions):
+        # Return cartesian coordinates for a list of stable_positions
+        return [self.get_position_from_stable(sp) for sp in stable_positions]
     def calc_stable_position(self, coord):
         # Return a stable_position from a cartesian coordinate
         pos = [ self.ffi_lib.itersolve_calc_position_from_coord(
@@ -111,6 +111,43 @@ def trilateration(sphere_coords, radius2):
     ez_z = matrix_mul(ez, z)
     return matrix_add(sphere_coord1, matrix_add(ex_x, matrix_add(ey_y, ez_z)))
 
+# Perform trilateration on a list of sphere heights for spheres with
+# fixed XY coordinates.  Subtracting the first sphere equation from
+# the others gives two linear equations that describe X and Y in terms
+# of Z, which reduces the problem to a quadratic equation in Z.  The
+# solution chosen is the same as the one selected by trilateration().
+def trilateration_xy(sphere_xy, sphere_zs, radius2):
+    (x1, y1), (x2, y2), (x3, y3) = sphere_xy
+    r1, r2, r3 = radius2
+    # Invert the (constant) 2x2 matrix of the linear equations
+    m00, m01, m10, m11 = x2 - x1, y2 - y1, x3 - x1, y3 - y1
+    det = m00 * m11 - m01 * m10
+    i00, i01, i10, i11 = m11 / det, -m01 / det, -m10 / det, m00 / det
+    sq1 = x1**2 + y1**2
+    k2 = .5 * (r1 - r2 + x2**2 + y2**2 - sq1)
+    k3 = .5 * (r1 - r3 + x3**2 + y3**2 - sq1)
+    sign = -1.
+    if det < 0.:
+        sign = 1.
+    sqrt = math.sqrt
+    out = []
+    for z1, z2, z3 in sphere_zs:
+        # X and Y as a function of Z: x = x1 + u + xb * z, y = y1 + v + yb * z
+        z1sq = z1**2
+        b2 = k2 + .5 * (z2**2 - z1sq)
+        b3 = k3 + .5 * (z3**2 - z1sq)
+        u = i00 * b2 + i01 * b3 - x1
+        v = i10 * b2 + i11 * b3 - y1
+        xb = i00 * (z1 - z2) + i01 * (z1 - z3)
+        yb = i10 * (z1 - z2) + i11 * (z1 - z3)
+        # Solve the first sphere equation for Z
+        qa = xb**2 + yb**2 + 1.
+        qb = u * xb + v * yb - z1
+        qc = u**2 + v**2 + z1sq - r1
+        z = (-qb + sign * sqrt(qb**2 - qa * qc)) / qa
+        out.append([x1 + u + xb * z, y1 + v + yb * z, z])
+    return out
+
 
 ######################################################################
 # Matrix helper functions for 3x1 matrices
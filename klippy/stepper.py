@@ -49,6 +49,9 @@ class MCU_stepper:
         self._stepper_kinematics = None
         self._itersolve_generate_steps = ffi_lib.itersolve_generate_steps
         self._itersolve_check_active = ffi_lib.itersolve_check_active
+        self._itersolve_get_commanded_pos = ffi_lib.itersolve_get_commanded_pos
+        self._itersolve_calc_position_from_coord = (
+            ffi_lib.itersolve_calc_position_from_coord)
         self._trapq = ffi_main.NULL
         self._mcu.get_printer().register_event_handler('klippy:connect',
                                                        self._query_mcu_position)
@@ -126,8 +129,7 @@ class MCU_stepper:
         ffi_lib.stepcompress_set_invert_sdir(self._stepqueue, invert_dir)
         self._mcu.get_printer().send_event("stepper:set_dir_inverted", self)
     def calc_position_from_coord(self, coord):
-        ffi_main, ffi_lib = chelper.get_ffi()
-        return ffi_lib.itersolve_calc_position_from_coord(
+        return self._itersolve_calc_position_from_coord(
             self._stepper_kinematics, coord[0], coord[1], coord[2])
     def set_position(self, coord):
         mcu_pos = self.get_mcu_position()
@@ -136,8 +138,7 @@ class MCU_stepper:
         ffi_lib.itersolve_set_position(sk, coord[0], coord[1], coord[2])
         self._set_mcu_position(mcu_pos)
     def get_commanded_position(self):
-        ffi_main, ffi_lib = chelper.get_ffi()
-        return ffi_lib.itersolve_get_commanded_pos(self._stepper_kinematics)
+        return self._itersolve_get_commanded_pos(self._stepper_kinematics)
     def get_mcu_position(self):
         mcu_pos_dist = self.get_commanded_position() + self._mcu_position_offset
         mcu_pos = mcu_pos_dist / self._step_dist
@@ -294,6 +295,8 @@ def parse_step_distance(config, units_in_radians=None, note_valid=False):
 class PrinterRail:
     def __init__(self, config, need_position_minmax=True,
                  default_position_endstop=None, units_in_radians=False):
+        self.printer = config.get_printer()
+        self.ppins = self.printer.lookup_object('pins')
         # Primary stepper and endstop
         self.stepper_units_in_radians = units_in_radians
         self.steppers = []
@@ -376,8 +379,8 @@ class PrinterRail:
             self.endstops[0][0].add_stepper(stepper)
             return
         endstop_pin = config.get('endstop_pin')
-        printer = config.get_printer()
-        ppins = printer.lookup_object('pins')
+        printer = self.printer
+        ppins = self.ppins
         pin_params = ppins.parse_pin(endstop_pin, True, True)
         # Normalize pin name
         pin_name = "%s:%s" % (pin_params['chip_name'], pin_params['pin'])
@@ -420,8 +423,9 @@ def LookupMultiRail(config, need_position_minmax=True,
                  default_position_endstop=None, units_in_radians=False):
     rail = PrinterRail(config, need_position_minmax,
                        default_position_endstop, units_in_radians)
+    name = config.get_name()
     for i in range(1, 99):
-        if not config.has_section(config.get_name() + str(i)):
+        if not config.has_section(name + str(i)):
             break
-        rail.add_extra_stepper(config.getsection(config.get_name() + str(i)))
+        rail.add_extra_stepper(config.getsection(name + str(i)))
     return rail
@@ -5,7 +5,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import sys, os, subprocess, optparse, logging, shlex, socket, time, traceback
-import json, zlib
+import json, zlib, itertools
 sys.path.append('./klippy')
 import msgproto
 
@@ -130,9 +130,8 @@ class HandleConstants:
             'DECL_CONSTANT_STR': self.decl_constant_str,
         }
     def set_value(self, name, value):
-        if name in self.constants and self.constants[name] != value:
+        if self.constants.setdefault(name, value) != value:
             error("Conflicting definition for constant '%s'" % name)
-        self.constants[name] = value
     def decl_constant(self, req):
         name, value = req.split()[1:]
         self.set_value(name, int(value, 0))
@@ -246,6 +245,10 @@ Handlers.append(Handle_arm_irq())
 # Wire protocol commands and responses
 ######################################################################
 
+# Number of C arguments used by a parameter type (buffers pass both a
+# length and a pointer)
+PARAM_NUM_ARGS = { 'PT_progmem_buffer': 2, 'PT_buffer': 2 }
+
 # Dynamic command and response registration
 class HandleCommandGeneration:
     def __init__(self):
@@ -260,18 +263,18 @@ class HandleCommandGeneration:
             '_DECL_OUTPUT': self.decl_output
         }
     def decl_command(self, req):
-        funcname, flags, msgname = req.split()[1:4]
+        funcname, flags, msg = req.split(None, 3)[1:]
+        msgname = msg.split(None, 1)[0]
         if msgname in self.commands:
             error("Multiple definitions for command '%s'" % msgname)
         self.commands[msgname] = (funcname, flags, msgname)
-        msg = req.split(None, 3)[3]
         m = self.messages_by_name.get(msgname)
         if m is not None and m != msg:
             error("Conflicting definition for command '%s'" % msgname)
         self.messages_by_name[msgname] = msg
     def decl_encoder(self, req):
         msg = req.split(None, 1)[1]
-        msgname = msg.split()[0]
+        msgname = msg.split(None, 1)[0]
         m = self.messages_by_name.get(msgname)
         if m is not None and m != msg:
             error("Conflicting definition for message '%s'" % msgname)
@@ -283,7 +286,7 @@ class HandleCommandGeneration:
     def create_message_ids(self):
         # Create unique ids for each message type
         msgid = max(self.msg_to_id.values())
-        mlist = list(self.commands.keys()) + [m for n, m in self.encoders]
+        mlist = itertools.chain(self.commands, (m for n, m in self.encoders))
         for msgname in mlist:
             msg = self.messages_by_name.get(msgname, msgname)
             if msg not in self.msg_to_id:
@@ -296,12 +299,12 @@ class HandleCommandGeneration:
         # Handle message ids over 96 (they are decoded as negative numbers)
         msg_to_tag = {msg: msgid if msgid < 96 else msgid - 128
                       for msg, msgid in self.msg_to_id.items()}
-        command_tags = [msg_to_tag[msg]
+        command_tags = {msg_to_tag[msg]
                         for msgname, msg in self.messages_by_name.items()
-                        if msgname in self.commands]
-        response_tags = [msg_to_tag[msg]
+                        if msgname in self.commands}
+        response_tags = {msg_to_tag[msg]
                          for msgname, msg in self.messages_by_name.items()
-                         if msgname not in self.commands]
+                         if msgname not in self.commands}
         data['commands'] = { msg: msgtag for msg, msgtag in msg_to_tag.items()
                              if msgtag in command_tags }
         data['responses'] = { msg: msgtag for msg, msgtag in msg_to_tag.items()
@@ -332,8 +335,7 @@ class HandleCommandGeneration:
     .param_types = %s,
 """ % (comment, msgid, len(types), params)
         if msgtype == 'response':
-            num_args = (len(types) + types.count('PT_progmem_buffer')
-                        + types.count('PT_buffer'))
+            num_args = sum([PARAM_NUM_ARGS.get(t, 1) for t in types])
             out += "    .num_args=%d," % (num_args,)
         else:
             max_size = min(msgproto.MESSAGE_MAX,
@@ -443,15 +445,14 @@ Handlers.append(HandleCommandGeneration())
 def check_output(prog):
     logging.debug("Running %s" % (repr(prog),))
     try:
-        process = subprocess.Popen(shlex.split(prog), stdout=subprocess.PIPE)
-        output = process.communicate()[0]
-        retcode = process.poll()
+        output = subprocess.check_output(shlex.split(prog))
+    except subprocess.CalledProcessError as e:
+        logging.debug("Got (code=%s): %s" % (e.returncode, repr(e.output)))
+        return ""
     except OSError:
         logging.debug("Exception on run: %s" % (traceback.format_exc(),))
         return ""
-    logging.debug("Got (code=%s): %s" % (retcode, repr(output)))
-    if retcode:
-        return ""
+    logging.debug("Got (code=0): %s" % (repr(output),))
     try:
         return str(output.decode('utf8'))
     except UnicodeError:
@@ -552,12 +553,12 @@ class HandleIdentify:
             f.close()
 
         # Format compressed info into C code
-        zdatadict = bytearray(zlib.compress(datadict.encode(), 9))
-        out = []
-        for i in range(len(zdatadict)):
-            if i % 8 == 0:
-                out.append('\n   ')
-            out.append(" 0x%02x," % (zdatadict[i],))
+        zdatadict = bytearray(zlib.compress(datadict.encode(), 6))
+        hex_table = [" 0x%02x," % (i,) for i in range(256)]
+        hexdata = ''.join(map(hex_table.__getitem__, zdatadict))
+        linelen = 8 * len(hex_table[0])
+        out = ['\n   ' + hexdata[i:i+linelen]
+               for i in range(0, len(hexdata), linelen)]
         fmt = """
 const uint8_t command_identify_data[] PROGMEM = {%s
 };
@@ -603,15 +604,15 @@ def main():
         req = req.lstrip()
         if not req:
             continue
-        cmd = req.split()[0]
+        cmd = req.split(None, 1)[0]
         if cmd not in ctr_dispatch:
             error("Unknown build time command '%s'" % cmd)
         ctr_dispatch[cmd](req)
 
     # Write output
-    code = "".join([FILEHEADER] + [h.generate_code(options) for h in Handlers])
+    code = [FILEHEADER] + [h.generate_code(options) for h in Handlers]
     f = open(outcfile, 'w')
-    f.write(code)
+    f.writelines(code)
     f.close()
 
 if __name__ == '__main__':